@@ -1,48 +1,203 @@
 import os
-import json
+import logging
+import random
+import asyncio
+import threading
+import concurrent.futures
+import hmac
+import secrets
+from types import SimpleNamespace
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 import streamlit as st
 import requests
-from datetime import datetime, timedelta
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
 from dotenv import load_dotenv
 import plotly.express as px
 import folium
 from streamlit_folium import st_folium
-import time
+import httpx
+from aiohttp import web
+import orjson
+import ijson
 
 # Load environment variables
 load_dotenv()
 
+# Debug logging of API payloads; enable with APP_DEBUG=1
+logging.basicConfig()
+LOG = logging.getLogger(__name__)
+if os.getenv('APP_DEBUG'):
+    LOG.setLevel(logging.DEBUG)
+
 # API configurations
 PALMETTO_API_KEY = os.getenv('PALMETTO_API_KEY')
 BAYOU_API_KEY = os.getenv('BAYOU_API_KEY')
 GOOGLE_MAPS_API_KEY = os.getenv('GOOGLE_MAPS_API_KEY')
 BAYOU_DOMAIN = "staging.bayou.energy"
+PUBLIC_URL = os.getenv('PUBLIC_URL')  # Public base URL for the Bayou webhook; polling only if unset
+BAYOU_WEBHOOK_HOST = os.getenv('BAYOU_WEBHOOK_HOST', '127.0.0.1')
+BAYOU_WEBHOOK_PORT = int(os.getenv('BAYOU_WEBHOOK_PORT', '8502'))
+BAYOU_WEBHOOK_SECRET = os.getenv('BAYOU_WEBHOOK_SECRET')  # Generated per process if unset
 
 # API URLs
 PALMETTO_BASE_URL = "https://ei.palmetto.com/api/v0/bem/calculate"
 BAYOU_BASE_URL = f"https://{BAYOU_DOMAIN}/api/v2"
+PLACES_AUTOCOMPLETE_URL = "https://places.googleapis.com/v1/places:autocomplete"
+PLACES_DETAILS_URL = "https://places.googleapis.com/v1/places/{place_id}"
+
+# Rate limiting and transient server errors worth retrying
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+def _retry_adapter(allowed_methods):
+    """HTTP adapter retrying rate limiting and transient server errors with exponential backoff"""
+    return HTTPAdapter(max_retries=Retry(
+        total=3,
+        backoff_factor=1.0,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=allowed_methods,
+        respect_retry_after_header=True
+    ))
+
+@st.cache_resource
+def _http_session():
+    """
+    Shared HTTP session: keep-alive connection pooling plus retries. Cached as a
+    resource so the pool survives Streamlit reruns instead of being rebuilt each time
+    """
+    session = requests.Session()
+    session.headers.update({"accept": "application/json"})
+    # The Palmetto and Places POSTs only read data, so they are safe to retry
+    session.mount("https://", _retry_adapter(["GET", "POST"]))
+    # Bayou POSTs create customers; retrying one the server already handled would duplicate it
+    session.mount(f"https://{BAYOU_DOMAIN}/", _retry_adapter(["GET"]))
+    return session
+
+# Bayou status polling backoff (seconds), and how many failed checks in a row to tolerate
+POLL_BASE_DELAY = 1
+POLL_MAX_DELAY = 30
+POLL_MAX_ERRORS = 5
+
+# Month names indexed by month number - 1
+_MONTHS = (
+    "January", "February", "March", "April", "May", "June",
+    "July", "August", "September", "October", "November", "December"
+)
+
+# Static display content for display_results, built once per script run
+# rather than on every call
+_RECOMMENDATIONS = (
+    "1. Consider solar installation based on your usage pattern",
+    "2. Implement energy-efficient lighting",
+    "3. Optimize HVAC scheduling",
+    "4. Monitor peak usage times"
+)
+_CHART_LABELS = {"x": "Month", "y": "Predicted Usage (kWh)"}
+
+@st.cache_data(ttl=60*60, show_spinner=False)
+def _cached_onboarding_token(customer_id):
+    """Fetch the customer's onboarding token; failures raise and are not cached"""
+    response = _http_session().get(
+        f"{BAYOU_BASE_URL}/customers/{customer_id}",
+        auth=(BAYOU_API_KEY, '')
+    )
+    response.raise_for_status()
+    return response.json().get("onboarding_token")
 
 def get_onboarding_token(customer_id):
     """Get onboarding token for the customer"""
     try:
-        response = requests.get(
-            f"{BAYOU_BASE_URL}/customers/{customer_id}",
-            auth=(BAYOU_API_KEY, '')
-        )
-        response.raise_for_status()
-        return response.json().get("onboarding_token"), None
+        return _cached_onboarding_token(customer_id), None
     except requests.exceptions.RequestException as e:
         return None, f"Error getting onboarding token: {str(e)}"
 
+@st.cache_resource
+def _bayou_callbacks():
+    """
+    Start the Bayou webhook receiver on a background thread, raising if it
+    cannot bind. Returns the events of customers currently waiting for bills
+    (guarded by lock, as both the receiver and script threads use them) and
+    the secret callbacks must carry.
+    """
+    callbacks = SimpleNamespace(
+        events={},
+        lock=threading.Lock(),
+        secret=BAYOU_WEBHOOK_SECRET or secrets.token_urlsafe(32)
+    )
+    
+    async def handle_callback(request):
+        if not hmac.compare_digest(request.query.get("secret", ""), callbacks.secret):
+            return web.Response(status=403)
+        try:
+            body = await request.json(loads=orjson.loads)
+        except ValueError:
+            return web.Response(status=400)
+        customer = body.get("object", {}) if isinstance(body, dict) else None
+        if not isinstance(customer, dict):
+            return web.Response(status=400)
+        
+        if body.get("event") == "bills_ready" or customer.get("bills_are_ready"):
+            # Only wake customers someone is waiting on, so stray callbacks leave nothing behind
+            with callbacks.lock:
+                event = callbacks.events.get(str(customer.get("id")))
+            if event:
+                event.set()
+        return web.Response()
+    
+    started = concurrent.futures.Future()
+    
+    def serve():
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        callback_app = web.Application()
+        callback_app.router.add_post("/bayou_callback", handle_callback)
+        runner = web.AppRunner(callback_app)
+        try:
+            loop.run_until_complete(runner.setup())
+            loop.run_until_complete(web.TCPSite(runner, BAYOU_WEBHOOK_HOST, BAYOU_WEBHOOK_PORT).start())
+        except Exception as e:
+            started.set_exception(e)
+            loop.close()
+            return
+        started.set_result(None)
+        loop.run_forever()
+    
+    threading.Thread(target=serve, name="bayou-webhook", daemon=True).start()
+    # Surface bind failures (e.g. port in use) to the caller; failures are not cached
+    started.result()
+    return callbacks
+
+async def _wait_for_callback(event, timeout):
+    """
+    Sleep for up to timeout seconds, waking early if Bayou's callback sets the
+    event. Returns whether the callback arrived
+    """
+    if event is None:
+        await asyncio.sleep(timeout)
+        return False
+    notified = await asyncio.to_thread(event.wait, timeout)
+    event.clear()
+    return notified
+
 def create_bayou_customer():
     """Create a new customer in Bayou"""
+    customer = {
+        "utility": "pacific_gas_and_electric",
+        "email": "test@example.com"  # Required field
+    }
+    if PUBLIC_URL:
+        # Have Bayou call us back when bills are ready instead of polling
+        try:
+            secret = _bayou_callbacks().secret
+            customer["webhook_url"] = f"{PUBLIC_URL}/bayou_callback?secret={secret}"
+        except OSError as e:
+            LOG.warning("Bayou webhook receiver unavailable, polling instead: %s", e)
+    
     try:
-        response = requests.post(
+        response = _http_session().post(
             f"{BAYOU_BASE_URL}/customers",
-            json={
-                "utility": "pacific_gas_and_electric",
-                "email": "test@example.com"  # Required field
-            },
+            json=customer,
             auth=(BAYOU_API_KEY, '')
         )
         response.raise_for_status()
@@ -50,154 +205,318 @@ def create_bayou_customer():
     except requests.exceptions.RequestException as e:
         return None, f"Error creating Bayou customer: {str(e)}"
 
-def get_bayou_data(customer_id):
+async def _get_json(client, url):
+    """GET a URL on the client and decode the JSON body"""
+    response = await client.get(url)
+    response.raise_for_status()
+    return orjson.loads(response.content)
+
+def _slim_bill(bill):
+    """Keep only the bill fields parse_bayou_to_palmetto reads"""
+    slim = {"meters": []}
+    if "electricity_consumption" in bill:
+        slim["electricity_consumption"] = bill["electricity_consumption"]
+    meter = _first_electric(bill.get("meters", []))
+    if meter:
+        slim["meters"].append({
+            key: meter[key]
+            for key in ("type", "billing_period_from", "billing_period_to", "address")
+            if key in meter
+        })
+    return slim
+
+async def _stream_bills(client, url):
     """
-    Get billing data from Bayou
+    GET the customer's bills, streaming the JSON array so only one full bill
+    is held in memory at a time
     """
-    headers = {
-        "accept": "application/json",
-        "Authorization": f"Bearer {BAYOU_API_KEY}"
-    }
-    
+    bills = []
+    parsed = ijson.sendable_list()
+    parser = ijson.items_coro(parsed, 'item', use_float=True)
+    async with client.stream("GET", url) as response:
+        response.raise_for_status()
+        async for chunk in response.aiter_bytes():
+            parser.send(chunk)
+            bills.extend(_slim_bill(bill) for bill in parsed)
+            del parsed[:]
+    parser.close()
+    bills.extend(_slim_bill(bill) for bill in parsed)
+    return bills
+
+def _retry_after(response):
+    """Seconds asked for by a response's Retry-After header, or None"""
+    value = response.headers.get("retry-after") if response is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+async def _discard(task):
+    """Cancel a speculative request, if any, and reap it"""
+    if task is not None:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+async def _poll_bills(client, customer_id, callbacks=None):
+    """
+    Poll the Bayou customer status until bills are ready, backing off exponentially.
+    With the webhook receiver's callbacks, Bayou's callback cuts each backoff
+    sleep short, so a lost callback costs nothing over plain polling. Once the
+    callback has said the bills are ready, the bills request is sent alongside
+    the confirming status check; before that a bills response could be partial,
+    so bills are only fetched after the status reports ready.
+    """
+    status_url = f"{BAYOU_BASE_URL}/customers/{customer_id}"
+    bills_url = f"{BAYOU_BASE_URL}/customers/{customer_id}/bills"
+    failures = 0
+    event = None
+    if callbacks is not None:
+        with callbacks.lock:
+            event = callbacks.events.setdefault(str(customer_id), threading.Event())
+    attempt = 0
+    notified = False
     try:
-        # Check customer status and wait for data to be ready
-        st.write("Checking if utility data is ready...")
         while True:
-            status_response = requests.get(
-                f"{BAYOU_BASE_URL}/customers/{customer_id}",
-                auth=(BAYOU_API_KEY, '')
-            )
-            status_response.raise_for_status()
-            customer_status = status_response.json()
+            bills_task = asyncio.create_task(_stream_bills(client, bills_url)) if notified else None
+            retry_after = None
+            try:
+                customer_status = await _get_json(client, status_url)
+                failures = 0
+            except (httpx.HTTPStatusError, httpx.TransportError) as e:
+                # Rate limiting and transient errors back off like a not-ready status
+                response = getattr(e, "response", None)
+                failures += 1
+                retryable = response is None or response.status_code in RETRY_STATUSES
+                if not retryable or failures > POLL_MAX_ERRORS:
+                    await _discard(bills_task)
+                    raise
+                LOG.warning("Bayou status check failed (attempt %d), retrying: %s", failures, e)
+                retry_after = _retry_after(response)
+                customer_status = {}
+            except Exception:
+                await _discard(bills_task)
+                raise
             
-            # Debug print for status
-            print("\n=== Bayou Customer Status ===")
-            print(json.dumps(customer_status, indent=2))
+            LOG.debug("Bayou customer status: %s", customer_status)
             
             if customer_status.get("bills_are_ready"):
                 st.success("Utility data is ready!")
-                break
+                bills = None
+                if bills_task is not None:
+                    bills = (await asyncio.gather(bills_task, return_exceptions=True))[0]
+                if isinstance(bills, Exception) or not bills:
+                    bills = await _stream_bills(client, bills_url)
+                return bills
+            
+            # Not ready yet, so whatever the speculative bills request returns is stale
+            await _discard(bills_task)
                 
             st.info("Waiting for utility data to be processed...")
-            time.sleep(5)  # Wait for 5 seconds before checking again
-        
-        # Now get the bills
-        bills_response = requests.get(
-            f"{BAYOU_BASE_URL}/customers/{customer_id}/bills",
-            auth=(BAYOU_API_KEY, '')
-        )
-        bills_response.raise_for_status()
-        bills = bills_response.json()
+            # Exponential backoff with jitter, capped at POLL_MAX_DELAY seconds,
+            # unless the server asked for a longer wait
+            delay = min(POLL_MAX_DELAY, POLL_BASE_DELAY * 2 ** attempt * (1 + random.random() * 0.5))
+            delay = max(delay, retry_after or 0)
+            attempt += 1
+            notified = await _wait_for_callback(event, delay)
+    finally:
+        if callbacks is not None:
+            with callbacks.lock:
+                callbacks.events.pop(str(customer_id), None)
+
+async def _fetch_bayou_bills(customer_id, callbacks=None):
+    """
+    Wait for the customer's bills to be ready and fetch them over a single
+    HTTP/2 connection, so the concurrent status and bills requests share it
+    """
+    async with httpx.AsyncClient(
+        http2=True,
+        auth=(BAYOU_API_KEY, ''),
+        timeout=30.0,
+        limits=httpx.Limits(max_keepalive_connections=20)
+    ) as client:
+        return await _poll_bills(client, customer_id, callbacks)
+
+def get_bayou_data(customer_id):
+    """
+    Get billing data from Bayou
+    """
+    callbacks = None
+    if PUBLIC_URL:
+        try:
+            callbacks = _bayou_callbacks()
+        except OSError as e:
+            LOG.warning("Bayou webhook receiver unavailable, polling instead: %s", e)
+    
+    try:
+        # Check customer status and wait for data to be ready
+        st.write("Checking if utility data is ready...")
+        bills = asyncio.run(_fetch_bayou_bills(customer_id, callbacks))
         
-        # Debug print for bills
-        print("\n=== Bayou Bills Data ===")
-        print(json.dumps(bills, indent=2))
+        LOG.debug("Bayou bills data: %s", bills)
+        if not bills:
+            return None, "No bills found for this utility account yet. Please try again shortly."
         
         return {
             "bills": bills
         }, None
-    except requests.exceptions.RequestException as e:
+    except (httpx.HTTPError, orjson.JSONDecodeError, ijson.JSONError) as e:
         return None, f"Error fetching Bayou data: {str(e)}"
 
-def get_energy_insights(payload):
+@st.cache_data(ttl=60*60, show_spinner=False)
+def _cached_insights(payload_json):
     """
-    Get energy insights from Palmetto Energy Insights API
+    POST a serialized payload to Palmetto and return the decoded response
     """
     headers = {
-        "accept": "application/json",
         "content-type": "application/json",
         "X-API-Key": PALMETTO_API_KEY
     }
-    
+    response = _http_session().post(PALMETTO_BASE_URL, data=payload_json, headers=headers)
+    response.raise_for_status()
+    # Decode straight from the body bytes, skipping the str round trip of response.text
+    return orjson.loads(response.content)
+
+def get_energy_insights(payload):
+    """
+    Get energy insights from Palmetto Energy Insights API
+    """
     try:
-        response = requests.post(PALMETTO_BASE_URL, json=payload, headers=headers)
-        response.raise_for_status()
-        return parse_response(response.text), None
+        # Canonical JSON so identical payloads share a cache entry
+        payload_json = orjson.dumps(payload, option=orjson.OPT_SORT_KEYS)
+        return parse_response(_cached_insights(payload_json)), None
     except requests.exceptions.RequestException as e:
         if hasattr(e.response, 'json'):
             st.write("Palmetto API Error Details:", e.response.json())
         return None, f"Error fetching data: {str(e)}"
 
-def parse_response(json_string):
+@st.cache_data(show_spinner=False)
+def parse_response(parsed):
     """
-    Parse the Palmetto API response following the demo implementation
+    Parse the decoded Palmetto API response following the demo implementation
     """
-    parsed = json.loads(json_string)
-    predictions = {}
-    for prediction_dict in parsed['data']['intervals']:
-        month = datetime.fromisoformat(prediction_dict['from_datetime']).strftime('%B')
-        predictions[month] = prediction_dict['value']
-    return predictions
+    # ISO-8601 timestamps always carry the month at positions 5:7
+    return {
+        _MONTHS[int(prediction_dict['from_datetime'][5:7]) - 1]: prediction_dict['value']
+        for prediction_dict in parsed['data']['intervals']
+    }
 
-def get_address_suggestions(query):
-    """Get address suggestions from Google Maps Places Autocomplete API"""
-    if not query:
-        return []
-    
-    url = "https://maps.googleapis.com/maps/api/place/autocomplete/json"
-    params = {
+@st.cache_data(ttl=24*60*60, show_spinner=False)
+def _cached_suggestions(query, _session_token=None):
+    """
+    Look up autocomplete predictions for a normalized query. The session token
+    is left out of the cache key so repeat queries hit the cache
+    """
+    headers = {
+        "X-Goog-Api-Key": GOOGLE_MAPS_API_KEY,
+        "X-Goog-FieldMask": "suggestions.placePrediction.placeId,suggestions.placePrediction.text"
+    }
+    body = {
         "input": query,
-        "key": GOOGLE_MAPS_API_KEY,
-        "components": "country:us",
-        "types": "address"  # Only return addresses
+        "includedRegionCodes": ["us"],
+        "includedPrimaryTypes": ["street_address", "premise", "subpremise"]  # Only return addresses
     }
+    if _session_token:
+        body["sessionToken"] = _session_token
+    response = _http_session().post(PLACES_AUTOCOMPLETE_URL, json=body, headers=headers)
+    response.raise_for_status()
+    
+    suggestions = []
+    for suggestion in response.json().get("suggestions", []):
+        prediction = suggestion.get("placePrediction")
+        if prediction:
+            suggestions.append({
+                "place_id": prediction["placeId"],
+                "address": prediction["text"]["text"]
+            })
+    return suggestions
+
+@st.cache_data(ttl=24*60*60, show_spinner=False)
+def _place_details(place_id, _session_token=None):
+    """Fetch formatted address and location for a single place"""
+    headers = {
+        "X-Goog-Api-Key": GOOGLE_MAPS_API_KEY,
+        "X-Goog-FieldMask": "formattedAddress,location"
+    }
+    params = {"sessionToken": _session_token} if _session_token else None
+    response = _http_session().get(PLACES_DETAILS_URL.format(place_id=place_id), params=params, headers=headers)
+    response.raise_for_status()
+    return response.json()
+
+def get_address_suggestions(query, session_token=None):
+    """
+    Get address suggestions from the Google Places Autocomplete (New) API.
+    Only place IDs and display text are returned; look up the chosen one with
+    get_place_location. Callers create one session token per address entry
+    (e.g. str(uuid.uuid4())) and pass it to both functions
+    """
+    query = (query or "").strip().lower()
+    if not query:
+        return []
     
     try:
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-        predictions = response.json().get("predictions", [])
-        
-        # Get full details for each prediction
-        suggestions = []
-        for prediction in predictions:
-            place_id = prediction["place_id"]
-            details_url = "https://maps.googleapis.com/maps/api/place/details/json"
-            details_params = {
-                "place_id": place_id,
-                "key": GOOGLE_MAPS_API_KEY,
-                "fields": "formatted_address,geometry"
-            }
-            
-            details_response = requests.get(details_url, params=details_params)
-            details_response.raise_for_status()
-            place_details = details_response.json().get("result", {})
-            
-            if place_details:
-                suggestions.append({
-                    "address": place_details["formatted_address"],
-                    "lat": place_details["geometry"]["location"]["lat"],
-                    "lng": place_details["geometry"]["location"]["lng"]
-                })
-        return suggestions
+        # Failed lookups raise, so errors are never cached
+        return _cached_suggestions(query, session_token)
     except Exception as e:
         st.error(f"Error fetching address suggestions: {str(e)}")
         return []
 
-def check_palmetto_service_area(lat, lon, postal_code):
+def get_place_location(place_id, session_token=None):
     """
-    Check if Palmetto services the area
+    Get the formatted address and coordinates of a selected suggestion.
+    Passing the autocomplete session token bills both calls as one session
+    """
+    try:
+        place = _place_details(place_id, session_token)
+        return {
+            "address": place["formattedAddress"],
+            "lat": place["location"]["latitude"],
+            "lng": place["location"]["longitude"]
+        }
+    except Exception as e:
+        st.error(f"Error fetching address details: {str(e)}")
+        return None
+
+@st.cache_data(ttl=24*60*60, show_spinner=False)
+def _cached_service_area(lat, lon, postal_code):
+    """
+    Fetch Palmetto's service area result for a location; failures raise and are not cached
     """
     headers = {
-        "accept": "application/json",
         "X-API-Key": PALMETTO_API_KEY
     }
+    url = f"{PALMETTO_BASE_URL}/service-area"
+    params = {
+        "lat": lat,
+        "lon": lon,
+        "postalCode": postal_code
+    }
     
+    response = _http_session().get(url, params=params, headers=headers)
+    response.raise_for_status()
+    return response.json()
+
+def check_palmetto_service_area(lat, lon, postal_code):
+    """
+    Check if Palmetto services the area
+    """
     try:
-        url = f"{PALMETTO_BASE_URL}/service-area"
-        params = {
-            "lat": lat,
-            "lon": lon,
-            "postalCode": postal_code
-        }
-        
-        response = requests.get(url, params=params, headers=headers)
-        response.raise_for_status()
-        return response.json(), None
+        return _cached_service_area(lat, lon, postal_code), None
     except requests.exceptions.RequestException as e:
         if hasattr(e.response, 'json'):
             st.write("Palmetto Service Area API Error Details:", e.response.json())
         return None, f"Error checking service area: {str(e)}"
 
+def _first_electric(meters):
+    """Return the first electric meter in a bill's meters, or None"""
+    return next((meter for meter in meters if meter.get("type") == "electric"), None)
+
 def parse_bayou_to_palmetto(bayou_data):
     """
     Parse Bayou data into Palmetto's preferred format
@@ -206,9 +525,7 @@ def parse_bayou_to_palmetto(bayou_data):
         return None, "No bills data available"
     
     try:
-        # Debug print to see the structure
-        print("\n=== Bayou Data Structure ===")
-        print(json.dumps(bayou_data, indent=2))
+        LOG.debug("Bayou data structure: %s", bayou_data)
         
         # Get address from the first bill's electric meter
         first_bill = bayou_data["bills"][0]
@@ -216,23 +533,17 @@ def parse_bayou_to_palmetto(bayou_data):
             return None, "No meters found in bills"
             
         # Find the electric meter for address
-        electric_meter = None
-        for meter in first_bill["meters"]:
-            if meter.get("type") == "electric":
-                electric_meter = meter
-                break
+        electric_meter = _first_electric(first_bill["meters"])
                 
         if not electric_meter or "address" not in electric_meter:
             return None, "No electric meter with address found"
             
         address = electric_meter["address"]
         # Format the full address string
-        address_str = f"{address['line_1']}"
-        if address.get('line_2'):
-            address_str += f" {address['line_2']}"
-        address_str += f", {address['city']}, {address['state']} {address['postal_code']}"
+        street = " ".join(filter(None, [address['line_1'], address.get('line_2')]))
+        address_str = f"{street}, {address['city']}, {address['state']} {address['postal_code']}"
         
-        print(f"\nFormatted Address: {address_str}")
+        LOG.debug("Formatted address: %s", address_str)
         
         # Create the base payload structure
         payload = {
@@ -247,35 +558,30 @@ def parse_bayou_to_palmetto(bayou_data):
             }
         }
         
-        # Add consumption data
-        actuals = []
-        for bill in bayou_data["bills"]:
-            if "electricity_consumption" in bill:  # First check if bill has consumption
-                # Find the electric meter in each bill
-                for meter in bill.get("meters", []):
-                    if (meter.get("type") == "electric" and 
-                        meter.get("billing_period_from") and 
-                        meter.get("billing_period_to")):
-                        actuals.append({
-                            "from_datetime": meter["billing_period_from"],
-                            "to_datetime": meter["billing_period_to"],
-                            "variable": "consumption.electricity",
-                            "value": float(bill["electricity_consumption"])/1000
-                        })
-                        break  # Only take the first electric meter reading
+        # Add consumption data, one reading per bill from its first electric meter
+        actuals = [
+            {
+                "from_datetime": meter["billing_period_from"],
+                "to_datetime": meter["billing_period_to"],
+                "variable": "consumption.electricity",
+                "value": float(bill["electricity_consumption"])/1000
+            }
+            for bill in bayou_data["bills"]
+            if "electricity_consumption" in bill
+            for meter in [_first_electric(bill.get("meters", []))]
+            if meter and meter.get("billing_period_from") and meter.get("billing_period_to")
+        ]
         
         if actuals:
             payload["consumption"] = {
                 "actuals": actuals
             }
         
-        # Debug print the final payload
-        print("\n=== Final Palmetto Payload ===")
-        print(json.dumps(payload, indent=2))
+        LOG.debug("Final Palmetto payload: %s", payload)
         
         return payload, None
     except Exception as e:
-        print(f"\nError in parse_bayou_to_palmetto: {str(e)}")
+        LOG.error("Error in parse_bayou_to_palmetto: %s", e)
         return None, f"Error parsing Bayou data: {str(e)}"
 
 def display_results(monthly_predictions):
@@ -295,7 +601,7 @@ def display_results(monthly_predictions):
         fig = px.bar(
             x=list(monthly_predictions.keys()),
             y=list(monthly_predictions.values()),
-            labels={"x": "Month", "y": "Predicted Usage (kWh)"},
+            labels=_CHART_LABELS,
             title="Monthly Energy Usage Predictions"
         )
         st.plotly_chart(fig, use_container_width=True)
@@ -314,14 +620,115 @@ def display_results(monthly_predictions):
     # Display recommendations
     st.subheader("Recommendations")
     st.write("Based on your energy profile, here are some general recommendations:")
-    recommendations = [
-        "Consider solar installation based on your usage pattern",
-        "Implement energy-efficient lighting",
-        "Optimize HVAC scheduling",
-        "Monitor peak usage times"
-    ]
-    for i, rec in enumerate(recommendations, 1):
-        st.write(f"{i}. {rec}")
+    for rec in _RECOMMENDATIONS:
+        st.write(rec)
+
+@st.fragment
+def _pg_fragment():
+    """P&G connection panel; its widgets rerun only this fragment"""
+    st.header("P&G Connection")
+    st.write("Connect to P&G to automatically retrieve your energy usage data, or skip to proceed.")
+    
+    col1, col2 = st.columns(2)
+    
+    # Only show the initial buttons if we haven't started the process
+    if st.session_state.onboarding_link is None and not st.session_state.pg_skipped:
+        with col1:
+            if st.button("Connect to P&G"):
+                if not BAYOU_API_KEY:
+                    st.error("Bayou API key is missing. Please check your configuration.")
+                else:
+                    try:
+                        # Create Bayou customer
+                        customer_data, error = create_bayou_customer()
+                        if error:
+                            st.error(error)
+                        else:
+                            st.session_state.bayou_customer = customer_data
+                            onboarding_link = customer_data.get("onboarding_link")
+                            if onboarding_link:
+                                st.session_state.onboarding_link = onboarding_link
+                                st.rerun(scope="fragment")
+                            else:
+                                st.error("Failed to get onboarding link from Bayou")
+                    except Exception as e:
+                        st.error(f"Error creating Bayou customer: {str(e)}")
+        
+        with col2:
+            if st.button("Skip P&G Connection"):
+                st.session_state.pg_skipped = True
+                st.session_state.pg_form_completed = True
+                st.rerun()
+    
+    # If we have an onboarding link, show it and the Completed Form button
+    if st.session_state.onboarding_link:
+        st.info(f"""
+        Please complete your P&G login using this link:
+        {st.session_state.onboarding_link}
+        """)
+        
+        st.info("Once you've completed the login form and see the success message, click the button below.")
+        
+        if st.button("Completed Form"):
+            customer_id = st.session_state.bayou_customer.get("id")
+            if customer_id:
+                try:
+                    response = _http_session().get(
+                        f"{BAYOU_BASE_URL}/customers/{customer_id}",
+                        auth=(BAYOU_API_KEY, '')
+                    )
+                    response.raise_for_status()
+                    customer_status = response.json()
+                    
+                    if customer_status.get("has_filled_credentials"):
+                        st.success("P&G connection successful!")
+                        
+                        # Get Bayou data
+                        bayou_data, error = get_bayou_data(customer_id)
+                        if error:
+                            st.error(error)
+                        else:
+                            st.session_state.bayou_data = bayou_data
+                            st.session_state.pg_form_completed = True
+                            st.success("Successfully retrieved your utility data!")
+                            st.rerun()
+                    else:
+                        st.warning("It seems the login form hasn't been completed yet. Please complete the form and try again.")
+                except requests.exceptions.RequestException as e:
+                    st.error(f"Error checking connection status: {str(e)}")
+            else:
+                st.error("No customer ID found. Please try connecting again.")
+
+@st.fragment
+def _insights_fragment():
+    """Energy insights panel; its widgets rerun only this fragment"""
+    st.header("Energy Insights")
+    
+    if st.button("Generate Insights"):
+        if not PALMETTO_API_KEY:
+            st.error("Palmetto API key is missing. Please check your configuration.")
+        else:
+            try:
+                # Parse Bayou data into Palmetto format
+                if st.session_state.bayou_data:
+                    payload, error = parse_bayou_to_palmetto(st.session_state.bayou_data)
+                    if error:
+                        st.error(error)
+                        return
+                else:
+                    st.error("No utility data available. Please connect to P&G first.")
+                    return
+                
+                # Get energy insights
+                insights, error = get_energy_insights(payload)
+                if error:
+                    st.error(error)
+                else:
+                    # Display results
+                    display_results(insights)
+            
+            except Exception as e:
+                st.error(f"Error getting energy insights: {str(e)}")
 
 def main():
     st.title("Business Energy Insights Tool")
@@ -342,108 +749,11 @@ def main():
     
     # P&G Connection Section
     if not st.session_state.pg_form_completed:
-        st.header("P&G Connection")
-        st.write("Connect to P&G to automatically retrieve your energy usage data, or skip to proceed.")
-        
-        col1, col2 = st.columns(2)
-        
-        # Only show the initial buttons if we haven't started the process
-        if st.session_state.onboarding_link is None and not st.session_state.pg_skipped:
-            with col1:
-                if st.button("Connect to P&G"):
-                    if not BAYOU_API_KEY:
-                        st.error("Bayou API key is missing. Please check your configuration.")
-                    else:
-                        try:
-                            # Create Bayou customer
-                            customer_data, error = create_bayou_customer()
-                            if error:
-                                st.error(error)
-                            else:
-                                st.session_state.bayou_customer = customer_data
-                                onboarding_link = customer_data.get("onboarding_link")
-                                if onboarding_link:
-                                    st.session_state.onboarding_link = onboarding_link
-                                    st.rerun()
-                                else:
-                                    st.error("Failed to get onboarding link from Bayou")
-                        except Exception as e:
-                            st.error(f"Error creating Bayou customer: {str(e)}")
-            
-            with col2:
-                if st.button("Skip P&G Connection"):
-                    st.session_state.pg_skipped = True
-                    st.session_state.pg_form_completed = True
-                    st.rerun()
-        
-        # If we have an onboarding link, show it and the Completed Form button
-        if st.session_state.onboarding_link:
-            st.info(f"""
-            Please complete your P&G login using this link:
-            {st.session_state.onboarding_link}
-            """)
-            
-            st.info("Once you've completed the login form and see the success message, click the button below.")
-            
-            if st.button("Completed Form"):
-                customer_id = st.session_state.bayou_customer.get("id")
-                if customer_id:
-                    try:
-                        response = requests.get(
-                            f"{BAYOU_BASE_URL}/customers/{customer_id}",
-                            auth=(BAYOU_API_KEY, '')
-                        )
-                        response.raise_for_status()
-                        customer_status = response.json()
-                        
-                        if customer_status.get("has_filled_credentials"):
-                            st.success("P&G connection successful!")
-                            
-                            # Get Bayou data
-                            bayou_data, error = get_bayou_data(customer_id)
-                            if error:
-                                st.error(error)
-                            else:
-                                st.session_state.bayou_data = bayou_data
-                                st.session_state.pg_form_completed = True
-                                st.success("Successfully retrieved your utility data!")
-                                st.rerun()
-                        else:
-                            st.warning("It seems the login form hasn't been completed yet. Please complete the form and try again.")
-                    except requests.exceptions.RequestException as e:
-                        st.error(f"Error checking connection status: {str(e)}")
-                else:
-                    st.error("No customer ID found. Please try connecting again.")
+        _pg_fragment()
     
     # Energy Insights Section
     if st.session_state.pg_form_completed:
-        st.header("Energy Insights")
-        
-        if st.button("Generate Insights"):
-            if not PALMETTO_API_KEY:
-                st.error("Palmetto API key is missing. Please check your configuration.")
-            else:
-                try:
-                    # Parse Bayou data into Palmetto format
-                    if st.session_state.bayou_data:
-                        payload, error = parse_bayou_to_palmetto(st.session_state.bayou_data)
-                        if error:
-                            st.error(error)
-                            return
-                    else:
-                        st.error("No utility data available. Please connect to P&G first.")
-                        return
-                    
-                    # Get energy insights
-                    insights, error = get_energy_insights(payload)
-                    if error:
-                        st.error(error)
-                    else:
-                        # Display results
-                        display_results(insights)
-                        
-                except Exception as e:
-                    st.error(f"Error getting energy insights: {str(e)}")
+        _insights_fragment()
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file